@@ -5,22 +5,35 @@ class AreaCalculator:
     @staticmethod
     def estimate_area_and_trees(mask: np.ndarray, pixel_to_m2: float, trees_per_m2: float):
         non_zero_pixels = int(np.count_nonzero(mask))
-        area_m2 = non_zero_pixels * pixel_to_m2
+        return AreaCalculator.estimate_area_and_trees_from_pixels(non_zero_pixels, pixel_to_m2, trees_per_m2)
+
+    @staticmethod
+    def estimate_area_and_trees_from_pixels(pixels: int, pixel_to_m2: float, trees_per_m2: float):
+        area_m2 = pixels * pixel_to_m2
         area_ha = area_m2 / 10_000
         trees_est = area_m2 * trees_per_m2
-        return non_zero_pixels, area_m2, area_ha, trees_est
+        return pixels, area_m2, area_ha, trees_est
 
     @staticmethod
     def calculate_forest_data(mask_trees: np.ndarray, mask_fields: np.ndarray, pixel_to_m2: float,
                               trees_per_m2: float, pollution: dict):
-        trees_px, trees_m2, trees_ha, existing_trees = AreaCalculator.estimate_area_and_trees(
-            mask_trees, pixel_to_m2, trees_per_m2
+        height, width = mask_trees.shape
+        return AreaCalculator.calculate_forest_data_from_counts(
+            int(np.count_nonzero(mask_trees)), int(np.count_nonzero(mask_fields)),
+            height, width, pixel_to_m2, trees_per_m2, pollution
         )
-        fields_px, fields_m2, fields_ha, _ = AreaCalculator.estimate_area_and_trees(
-            mask_fields, pixel_to_m2, trees_per_m2
+
+    @staticmethod
+    def calculate_forest_data_from_counts(trees_pixels: int, fields_pixels: int, height: int, width: int,
+                                          pixel_to_m2: float, trees_per_m2: float, pollution: dict):
+        """Same as calculate_forest_data, but from cached segmentation pixel counts."""
+        trees_px, trees_m2, trees_ha, existing_trees = AreaCalculator.estimate_area_and_trees_from_pixels(
+            trees_pixels, pixel_to_m2, trees_per_m2
+        )
+        fields_px, fields_m2, fields_ha, _ = AreaCalculator.estimate_area_and_trees_from_pixels(
+            fields_pixels, pixel_to_m2, trees_per_m2
         )
 
-        height, width = mask_trees.shape
         total_area_m2 = height * width * pixel_to_m2
         forest_percent = trees_m2 / total_area_m2 if total_area_m2 > 0 else 0
 
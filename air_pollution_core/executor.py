@@ -0,0 +1,149 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory
+from typing import Optional, Tuple
+import numpy as np
+import cv2
+from air_pollution_core.mask import MaskGenerator
+from air_pollution_core.parcels import ParcelExtractor
+from air_pollution_core.visualizer import ImageVisualizer
+
+LABEL_NONE = 0
+LABEL_FIELDS = 1
+LABEL_TREES = 2
+
+# Per-process state, built once by the pool initializer
+_mask_generator = None
+_parcel_extractor = None
+
+
+def analyze_rgb(rgb: np.ndarray, mask_generator: MaskGenerator, parcel_extractor: ParcelExtractor,
+                labels_out: np.ndarray, overlay_out: np.ndarray) -> dict:
+    """Segment an RGB image, writing the label mask and overlay into the given buffers."""
+    img_hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    mask_trees, mask_fields = mask_generator.generate_masks_from_hsv(img_hsv)
+
+    labels_out[:] = LABEL_NONE
+    labels_out[mask_fields > 0] = LABEL_FIELDS
+    labels_out[mask_trees > 0] = LABEL_TREES
+    overlay_out[:] = ImageVisualizer.overlay_masks_array(img_hsv, mask_trees, mask_fields)
+
+    height, width = mask_trees.shape
+    return {
+        "trees_pixels": int(np.count_nonzero(mask_trees)),
+        "fields_pixels": int(np.count_nonzero(mask_fields)),
+        "height": height,
+        "width": width,
+        "parcels": parcel_extractor.extract(mask_fields)
+    }
+
+
+def _init_worker(hsv_ranges, min_pixels: int, simplify_epsilon: float):
+    global _mask_generator, _parcel_extractor
+    # Parallelism comes from the pool; keep OpenCV from oversubscribing cores
+    cv2.setNumThreads(1)
+    _mask_generator = MaskGenerator(hsv_ranges)
+    _parcel_extractor = ParcelExtractor(min_pixels, simplify_epsilon)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _analyze_shared(rgb_name: str, labels_name: str, overlay_name: str, shape: Tuple[int, int]) -> dict:
+    blocks = [shared_memory.SharedMemory(name=name) for name in (rgb_name, labels_name, overlay_name)]
+    try:
+        rgb = np.ndarray((*shape, 3), dtype=np.uint8, buffer=blocks[0].buf)
+        labels = np.ndarray(shape, dtype=np.uint8, buffer=blocks[1].buf)
+        overlay = np.ndarray((*shape, 3), dtype=np.uint8, buffer=blocks[2].buf)
+        stats = analyze_rgb(rgb, _mask_generator, _parcel_extractor, labels, overlay)
+        del rgb, labels, overlay
+        return stats
+    finally:
+        for block in blocks:
+            block.close()
+
+
+class AnalysisExecutor:
+    """Runs segmentation in a warm process pool, passing image buffers through shared memory.
+
+    With max_workers=0 the analysis runs inline on the calling thread. A pool broken
+    by a crashed worker is replaced and the analysis retried once.
+    """
+
+    def __init__(self, hsv_ranges, max_workers: Optional[int] = None,
+                 parcel_extractor: Optional[ParcelExtractor] = None):
+        # One core is left to the web server; single-core hosts analyse inline
+        self.max_workers = max(0, (os.cpu_count() or 1) - 1) if max_workers is None else max_workers
+        self.hsv_ranges = hsv_ranges
+        self.mask_generator = MaskGenerator(hsv_ranges)
+        self.parcel_extractor = parcel_extractor or ParcelExtractor()
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+        if self.max_workers > 0:
+            self.pool = self._start_pool()
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        pool = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.hsv_ranges, self.parcel_extractor.min_pixels, self.parcel_extractor.simplify_epsilon)
+        )
+        self.warm_up(pool)
+        return pool
+
+    def warm_up(self, pool: Optional[ProcessPoolExecutor] = None):
+        # Concurrent submissions make the pool start every worker up front
+        pool = pool or self.pool
+        wait([pool.submit(_ping) for _ in range(self.max_workers)])
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        with self.pool_lock:
+            # Concurrent callers hit by the same crash share one replacement
+            if self.pool is broken:
+                print("Analysis pool broke, restarting workers")
+                broken.shutdown(wait=False)
+                self.pool = self._start_pool()
+            return self.pool
+
+    def _run(self, *args):
+        pool = self.pool
+        try:
+            return pool.submit(_analyze_shared, *args).result()
+        except BrokenProcessPool:
+            return self._replace_pool(pool).submit(_analyze_shared, *args).result()
+
+    def analyze(self, rgb: np.ndarray) -> Tuple[dict, np.ndarray, np.ndarray]:
+        """Return (statistics, label mask, overlay RGB array) for an RGB uint8 image."""
+        rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        shape = rgb.shape[:2]
+
+        if self.pool is None:
+            labels = np.empty(shape, dtype=np.uint8)
+            overlay = np.empty_like(rgb)
+            stats = analyze_rgb(rgb, self.mask_generator, self.parcel_extractor, labels, overlay)
+            return stats, labels, overlay
+
+        blocks = []
+        try:
+            for size in (rgb.nbytes, rgb.nbytes // 3, rgb.nbytes):
+                blocks.append(shared_memory.SharedMemory(create=True, size=size))
+            np.ndarray(rgb.shape, dtype=np.uint8, buffer=blocks[0].buf)[:] = rgb
+
+            stats = self._run(blocks[0].name, blocks[1].name, blocks[2].name, shape)
+
+            labels = np.ndarray(shape, dtype=np.uint8, buffer=blocks[1].buf).copy()
+            overlay = np.ndarray(rgb.shape, dtype=np.uint8, buffer=blocks[2].buf).copy()
+            return stats, labels, overlay
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
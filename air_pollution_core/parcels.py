@@ -0,0 +1,55 @@
+import numpy as np
+import cv2
+from typing import List, Tuple
+
+class ParcelExtractor:
+    def __init__(self, min_pixels: int = 20, simplify_epsilon: float = 1.5):
+        self.min_pixels = min_pixels
+        self.simplify_epsilon = simplify_epsilon
+
+    def extract(self, mask_fields: np.ndarray) -> List[dict]:
+        """Split the fields mask into connected parcels with simplified outlines in pixel space."""
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(
+            (mask_fields > 0).astype(np.uint8), connectivity=8
+        )
+
+        parcels = []
+        for label in range(1, count):
+            x, y, w, h, pixels = stats[label]
+            if pixels < self.min_pixels:
+                continue
+
+            # Trace only the component's bounding box instead of the whole raster
+            component = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+            contours, _ = cv2.findContours(component, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            contour = max(contours, key=cv2.contourArea)
+            outline = cv2.approxPolyDP(contour, self.simplify_epsilon, True).reshape(-1, 2) + (x, y)
+
+            parcels.append({
+                "pixels": int(pixels),
+                "outline": outline.tolist(),
+                "centroid": [round(float(c), 2) for c in centroids[label]]
+            })
+        return parcels
+
+    @staticmethod
+    def georeference(parcels: List[dict], bbox: Tuple[float, float, float, float],
+                     height: int, width: int, pixel_to_m2: float) -> List[dict]:
+        west, south, east, north = bbox
+        lon_per_px = (east - west) / width
+        lat_per_px = (north - south) / height
+
+        def to_lon_lat(point):
+            return [round(west + point[0] * lon_per_px, 6), round(north - point[1] * lat_per_px, 6)]
+
+        result = []
+        for parcel in parcels:
+            area_m2 = parcel["pixels"] * pixel_to_m2
+            outline = [to_lon_lat(p) for p in parcel["outline"]]
+            result.append({
+                "area_m2": round(area_m2, 2),
+                "area_hectares": round(area_m2 / 10_000, 4),
+                "centroid": to_lon_lat(parcel["centroid"]),
+                "outline": outline
+            })
+        return result
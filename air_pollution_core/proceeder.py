@@ -1,23 +1,34 @@
-from air_pollution_core.mask import MaskGenerator
 from air_pollution_core.calculator import AreaCalculator
-from air_pollution_core.visualizer import ImageVisualizer
-from lookup.api import AbstractAPIManager, FreeAPIManager
+from air_pollution_core.executor import AnalysisExecutor
+from air_pollution_core.parcels import ParcelExtractor
+from lookup.api import AbstractAPIManager, FreeAPIManager, IMAGERY_HASH_INFO
 from db.file_storage import LocalFileStorage
 from db.mongo.mongo_storage import MongoFileStorage
+from db.mongo.parcel_index import MongoParcelIndex
+from db.mongo.location_index import MongoLocationIndex
+from db.write_behind import WriteBehindStorage
 from PIL import Image
 import numpy as np
 import cv2
+import hashlib
+import json
+from typing import Optional
 
 class SatelliteImageProceeder:
 
     HSV_RANGES_ID = "calibration/simple_mask/hsv_ranges"
+    # Bump when segmentation itself changes so cached analyses are recomputed
+    ANALYSIS_VERSION = 2
 
     def __init__(
         self, owm_api, mongo_ip, mongo_port, mongo_user, mongo_pass,
-        trees_per_m2: float = 0.02
+        trees_per_m2: float = 0.02, analysis_workers: Optional[int] = None
     ):
-        self.file_storage = MongoFileStorage(mongo_ip, mongo_port, mongo_user, mongo_pass)
+        self.mongo_storage = MongoFileStorage(mongo_ip, mongo_port, mongo_user, mongo_pass)
+        self.file_storage = WriteBehindStorage(self.mongo_storage)
         self.api = FreeAPIManager(self.file_storage, owm_api)
+        self.parcel_index = MongoParcelIndex(self.mongo_storage.crud)
+        self.location_index = MongoLocationIndex(self.mongo_storage.crud)
         self.trees_per_m2 = trees_per_m2
         
         hsv_ranges = self.file_storage.load_dict(self.HSV_RANGES_ID)
@@ -30,9 +41,10 @@ class SatelliteImageProceeder:
             }
             self.file_storage.save_dict(hsv_ranges, self.HSV_RANGES_ID)
 
-        self.mask_generator = MaskGenerator(hsv_ranges)
+        self.calibration_version = self.compute_calibration_version(hsv_ranges)
         self.area_calculator = AreaCalculator()
-        self.visualizer = ImageVisualizer()
+        self.parcel_extractor = ParcelExtractor()
+        self.executor = AnalysisExecutor(hsv_ranges, analysis_workers, self.parcel_extractor)
 
     def to_hsv_np(self, image_pil: Image.Image) -> np.ndarray:
         """Convert PIL image to HSV NumPy array (single conversion)."""
@@ -40,35 +52,104 @@ class SatelliteImageProceeder:
         return cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
 
     def process_by_place(self, place_name: str):
-        img, pixel_m2, pollution = self.api.get_photo_by_place(place_name)
-        return self.process_satellite_image(img, pixel_m2, place_name, pollution)
+        img, pixel_m2, pollution, coords = self.api.get_photo_by_place(place_name)
+        bbox = self.api.compute_bbox(coords["lat"], coords["lng"])
+        return self.process_satellite_image(img, pixel_m2, place_name, pollution, bbox)
+
+    def compute_calibration_version(self, hsv_ranges) -> str:
+        payload = json.dumps({"hsv_ranges": hsv_ranges, "version": self.ANALYSIS_VERSION}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def compute_analysis_key(self, img: Image.Image) -> str:
+        """Content address of an analysis: hash of the imagery plus the calibration version.
+
+        Downloaded photos carry the hash of their original bytes, which stays the same
+        whether the image comes fresh from the provider or from the JPEG copy in storage.
+        Other images fall back to hashing the decoded pixels.
+        """
+        imagery_hash = img.info.get(IMAGERY_HASH_INFO)
+        if not imagery_hash:
+            rgb = np.ascontiguousarray(np.asarray(img.convert("RGB")))
+            digest = hashlib.sha256(str(rgb.shape).encode("utf-8"))
+            digest.update(rgb.data)
+            imagery_hash = digest.hexdigest()
+        return f"{imagery_hash}_{self.calibration_version}"
+
+    def segment(self, img: Image.Image, analysis_key: str):
+        segmentation_id = f"analyses/{analysis_key}/segmentation"
+        overlay_id = f"analyses/{analysis_key}/overlay"
+
+        saved_segmentation = self.file_storage.load_dict(segmentation_id)
+        saved_overlay = self.file_storage.load_img(overlay_id)
 
-    def process_satellite_image(self, img: Image.Image, pixel_to_m2: float, place_name: str, pollution):
-        forest_data_id = f"locations/{place_name}/forest_data"
-        overlay_id = f"locations/{place_name}/overlay"
+        if saved_segmentation is not None and saved_overlay is not None:
+            return saved_segmentation, saved_overlay
 
-        saved_forest_data = self.file_storage.load_dict(forest_data_id)
-        saved_overlay = self.file_storage.load_img(overlay_id)
+        segmentation, _, overlay_rgb = self.executor.analyze(np.asarray(img.convert("RGB")))
+
+        overlay = Image.fromarray(overlay_rgb)
+        self.file_storage.save_dict(segmentation, segmentation_id)
+        self.file_storage.save_img(overlay, overlay_id)
+
+        return segmentation, overlay
 
-        if saved_forest_data is not None and saved_overlay is not None:
-            return {"image": saved_overlay, **saved_forest_data}
+    def process_satellite_image(self, img: Image.Image, pixel_to_m2: float, place_name: str, pollution,
+                                bbox=None):
+        forest_data_id = f"locations/{place_name}/forest_data"
+        analysis_key = self.compute_analysis_key(img)
 
-        img_hsv = self.to_hsv_np(img)
-        mask_trees, mask_fields = self.mask_generator.generate_masks_from_hsv(img_hsv)
+        # Only segmentation and the overlay are cached; forest_data depends on the
+        # pollution entry, which is refreshed in the background, so rebuild it every time
+        segmentation, overlay = self.segment(img, analysis_key)
 
-        forest_data = self.area_calculator.calculate_forest_data(
-            mask_trees, mask_fields, pixel_to_m2,
+        forest_data = self.area_calculator.calculate_forest_data_from_counts(
+            segmentation["trees_pixels"], segmentation["fields_pixels"],
+            segmentation["height"], segmentation["width"], pixel_to_m2,
             trees_per_m2=self.trees_per_m2,
             pollution=pollution
-            
         )
+        forest_data["analysis_key"] = analysis_key
 
-        overlay = self.visualizer.overlay_masks(img_hsv, mask_trees, mask_fields)
-        self.file_storage.save_dict(forest_data, forest_data_id)
-        self.file_storage.save_img(overlay, overlay_id)
+        saved_forest_data = self.file_storage.load_dict(forest_data_id)
+        if saved_forest_data != forest_data:
+            saved_key = (saved_forest_data or {}).get("analysis_key")
+            stored_forest_data = forest_data
+            if bbox is not None and saved_key != analysis_key:
+                parcels = self.parcel_extractor.georeference(
+                    segmentation["parcels"], bbox,
+                    segmentation["height"], segmentation["width"], pixel_to_m2
+                )
+                # Written synchronously rather than through file_storage: the key below may
+                # only be recorded once the parcels are in. The write is idempotent and runs
+                # only when a place's imagery changes, so it rarely costs a request anything.
+                if not self.parcel_index.save_parcels(place_name, analysis_key, parcels):
+                    # Keep the old key so the next request retries the parcel write
+                    stored_forest_data = {**forest_data, "analysis_key": saved_key}
+
+            self.file_storage.save_dict(stored_forest_data, forest_data_id)
+
+        # Checked separately so locations analysed before summaries existed get indexed too
+        summary_id = f"locations/{place_name}/summary"
+        summary = self.build_summary(forest_data, bbox)
+        if self.file_storage.load_dict(summary_id) != summary:
+            self.file_storage.save_dict(summary, summary_id)
 
         return {"image": overlay, **forest_data}
 
+    @staticmethod
+    def build_summary(forest_data: dict, bbox=None) -> dict:
+        """Flat, indexed fields used by the location queries."""
+        summary = {
+            "aqi": forest_data["pollution"]["current_aqi"],
+            "coverage_percent": forest_data["forest_coverage_percent"],
+            "plantable_hectares": forest_data["fields"]["area_hectares"],
+            "trees_to_plant": forest_data["trees_to_plant_for_clean_air"]
+        }
+        if bbox is not None:
+            west, south, east, north = bbox
+            summary["location"] = {"type": "Point", "coordinates": [(west + east) / 2, (south + north) / 2]}
+        return summary
+
     import numpy as np
 
     @staticmethod
@@ -106,4 +187,10 @@ class SatelliteImageProceeder:
     
     def get_storage(self):
         return self.file_storage
+
+    def get_parcel_index(self):
+        return self.parcel_index
+
+    def get_location_index(self):
+        return self.location_index
         
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Throughput of AnalysisExecutor for different pool sizes.
+
+Run from the project root:
+
+    python -m benchmarks.analysis_executor --images 64 --workers 0 1 2 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+from PIL import Image
+from air_pollution_core.executor import AnalysisExecutor
+from air_pollution_core.proceeder import SatelliteImageProceeder
+
+
+def load_hsv_ranges():
+    ranges = {}
+    for name, path in (("trees", "calibration_images/forest_full.png"), ("fields", "calibration_images/field_full.png")):
+        rgb = np.asarray(Image.open(path).convert("RGB"))
+        ranges[name] = SatelliteImageProceeder.analyze_hsv_range(cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV))
+    return ranges
+
+
+def make_images(count: int, width: int, height: int):
+    """Random patchworks of the calibration textures, so every stage has real work to do."""
+    rng = np.random.default_rng(0)
+    textures = [
+        np.asarray(Image.open(path).convert("RGB").resize((width, height)))
+        for path in ("calibration_images/forest_full.png", "calibration_images/field_full.png")
+    ]
+    images = []
+    for _ in range(count):
+        choice = rng.integers(0, 3, (height // 20, width // 20))
+        choice = np.kron(choice, np.ones((20, 20), dtype=choice.dtype))
+        img = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+        for i, texture in enumerate(textures):
+            img[choice == i] = texture[choice == i]
+        images.append(img)
+    return images
+
+
+def run(workers: int, images, concurrency: int) -> float:
+    executor = AnalysisExecutor(load_hsv_ranges(), max_workers=workers)
+    try:
+        executor.analyze(images[0])
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as requests:
+            list(requests.map(executor.analyze, images))
+        return len(images) / (time.perf_counter() - start)
+    finally:
+        executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--width", type=int, default=600)
+    parser.add_argument("--height", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({0, 1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--concurrency", type=int, default=16, help="simulated request threads")
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.width, args.height)
+    baseline = None
+    print(f"cpus: {os.cpu_count()}, images: {args.images} x {args.width}x{args.height}, "
+          f"concurrent callers: {args.concurrency}")
+    print(f"{'workers':>8} {'images/s':>10} {'speedup':>8}")
+    for workers in args.workers:
+        throughput = run(workers, images, args.concurrency)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
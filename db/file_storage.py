@@ -1,6 +1,6 @@
 import os
 import json
-from typing import Optional, Any
+from typing import Optional, Any, List, Tuple
 from PIL import Image
 from abc import ABC, abstractmethod
 
@@ -25,6 +25,16 @@ class AbstractFileStorage(ABC):
         """Load an image from a file."""
         pass
 
+    def save_many(self, items: List[Tuple[str, Any]]) -> bool:
+        """Save several (file_id, dict or image) pairs."""
+        ok = True
+        for file_id, value in items:
+            if isinstance(value, Image.Image):
+                ok = self.save_img(value, file_id) and ok
+            else:
+                ok = self.save_dict(value, file_id) and ok
+        return ok
+
 
 class LocalFileStorage(AbstractFileStorage):
     def __init__(self, storage_dir="storage"):
@@ -1,12 +1,16 @@
-from pymongo import MongoClient
-from typing import Optional, Any
+from pymongo import MongoClient, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
+from typing import Optional, Any, Dict, List
 from bson.binary import Binary
 from bson import ObjectId
+import hashlib
 
 class MongoCRUD:
     def __init__(self, mongo_uri="mongodb://localhost:27017", db_name="file_storage"):
         self.client = MongoClient(mongo_uri)
         self.db = self.client[db_name]
+        self.db["__files__"].create_index("sha256", unique=True, sparse=True)
+        self.db["__files__"].create_index("owners")
 
     def get_collection(self, collection: str):
         return self.db[collection]
@@ -24,9 +28,65 @@ class MongoCRUD:
             upsert=True
         )
 
-    def insert_file_binary(self, file_bytes: bytes) -> Any:
+    def update_documents(self, collection: str, updates: Dict[str, dict]):
+        """Set several fields on several documents in one bulk write: {name: {field: value}}."""
+        if not updates:
+            return
+        self.db[collection].bulk_write([
+            UpdateOne({"name": name}, {"$set": fields, "$setOnInsert": {"name": name}}, upsert=True)
+            for name, fields in updates.items()
+        ], ordered=False)
+
+    def insert_file_binary(self, file_bytes: bytes, owner: str) -> Any:
+        """Store a blob by content hash and record owner ('collection/document/field') as a user.
+
+        Identical blobs share one document. Owners are kept as a set, so saving again is idempotent.
+        """
+        return self.insert_file_binaries([file_bytes], [owner])[0]
+
+    def insert_file_binaries(self, files: List[bytes], owners: List[str]) -> List[Any]:
+        """Bulk version of insert_file_binary; returns refs in the same order as files."""
+        if not files:
+            return []
+        files_collection = self.db["__files__"]
+        digests = [hashlib.sha256(file_bytes).hexdigest() for file_bytes in files]
+        operations = [
+            UpdateOne(
+                {"sha256": digest},
+                {"$addToSet": {"owners": owner}, "$setOnInsert": {"file_data": Binary(file_bytes)}},
+                upsert=True
+            )
+            for digest, file_bytes, owner in zip(digests, files, owners)
+        ]
+        try:
+            files_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Upserts that lost a race with a concurrent insert of the same blob; the blob exists now
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            files_collection.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+
+        refs = {
+            doc["sha256"]: doc["_id"]
+            for doc in files_collection.find({"sha256": {"$in": digests}}, {"sha256": 1})
+        }
+        return [refs[digest] for digest in digests]
+
+    def release_file_binaries(self, current_refs: Dict[str, Any]):
+        """Detach each owner from every blob except its current one ({owner: ref}) and drop unowned blobs."""
+        if not current_refs:
+            return
         files_collection = self.db["__files__"]
-        return files_collection.insert_one({"file_data": Binary(file_bytes)}).inserted_id
+        stale = [{"owners": owner, "_id": {"$ne": ref}} for owner, ref in current_refs.items()]
+        released = [doc["_id"] for doc in files_collection.find({"$or": stale}, {"_id": 1})]
+        if not released:
+            return
+        files_collection.bulk_write([
+            UpdateMany(query, {"$pull": {"owners": query["owners"]}}) for query in stale
+        ], ordered=False)
+        # Only blobs released here can have lost their last owner, so don't scan the rest
+        files_collection.delete_many({"_id": {"$in": released}, "owners": {"$size": 0}})
 
     def load_file_binary(self, file_id) -> Optional[bytes]:
         files_collection = self.db["__files__"]
@@ -44,10 +104,17 @@ class MongoCRUD:
         result = self.db[collection].delete_one({"name": name})
         return result.deleted_count > 0
 
-    def delete_file_binary(self, file_id) -> bool:
+    def delete_file_binary(self, file_id, owner: str) -> bool:
+        """Detach owner from a blob and delete it once nothing points at it."""
         files_collection = self.db["__files__"]
-        result = files_collection.delete_one({"_id": file_id})
-        return result.deleted_count > 0
+        result = files_collection.update_one({"_id": file_id}, {"$pull": {"owners": owner}})
+        if result.matched_count == 0:
+            return False
+        files_collection.delete_one({
+            "_id": file_id,
+            "$or": [{"owners": {"$size": 0}}, {"owners": {"$exists": False}}]
+        })
+        return True
     
     def is_file_ref(self, value: Any) -> bool:
         if not isinstance(value, ObjectId):
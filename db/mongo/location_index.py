@@ -0,0 +1,34 @@
+from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+from db.mongo.crud import MongoCRUD
+
+
+class MongoLocationIndex:
+    """Queries over the summary field that analysed locations keep in the locations collection."""
+
+    COLLECTION = "locations"
+    SORT_FIELDS = ("aqi", "coverage_percent", "plantable_hectares", "trees_to_plant")
+    PROJECTION = {"_id": 0, "name": 1, "summary": 1}
+
+    def __init__(self, crud: MongoCRUD):
+        self.collection = crud.get_collection(self.COLLECTION)
+        self.collection.create_index([("summary.location", GEOSPHERE)])
+        for field in self.SORT_FIELDS:
+            self.collection.create_index([(f"summary.{field}", DESCENDING)])
+
+    def top(self, field: str, limit: int = 10, ascending: bool = False) -> List[dict]:
+        if field not in self.SORT_FIELDS:
+            raise ValueError(f"field must be one of {', '.join(self.SORT_FIELDS)}")
+        key = f"summary.{field}"
+        cursor = self.collection.find({key: {"$exists": True}}, self.PROJECTION)
+        return list(cursor.sort(key, ASCENDING if ascending else DESCENDING).limit(limit))
+
+    def nearest(self, lat: float, lon: float, limit: int = 10,
+                max_distance_km: Optional[float] = None, min_aqi: Optional[float] = None) -> List[dict]:
+        near = {"$geometry": {"type": "Point", "coordinates": [lon, lat]}}
+        if max_distance_km is not None:
+            near["$maxDistance"] = max_distance_km * 1000
+        query = {"summary.location": {"$nearSphere": near}}
+        if min_aqi is not None:
+            query["summary.aqi"] = {"$gt": min_aqi}
+        return list(self.collection.find(query, self.PROJECTION).limit(limit))
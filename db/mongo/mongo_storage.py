@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Any, List, Tuple
 from PIL import Image
 import io
 from db.file_storage import AbstractFileStorage
@@ -35,22 +35,46 @@ class MongoFileStorage(AbstractFileStorage):
             print(f"Error loading dict: {e}")
             return None
 
-    def save_img(self, img: Image.Image, file_id: str) -> bool:
-        try:
-            collection, document, field = self._parse_id(file_id)
+    def _encode_img(self, img: Image.Image) -> bytes:
+        img_bytes_io = io.BytesIO()
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.save(img_bytes_io, format="JPEG")
+        return img_bytes_io.getvalue()
 
-            img_bytes_io = io.BytesIO()
-            if img.mode not in ("RGB", "L"):
-                img = img.convert("RGB")
-            img.save(img_bytes_io, format="JPEG")
-            img_bytes = img_bytes_io.getvalue()
+    def save_img(self, img: Image.Image, file_id: str) -> bool:
+        return self.save_many([(file_id, img)])
 
-            file_ref = self.crud.insert_file_binary(img_bytes)
+    def save_many(self, items: List[Tuple[str, Any]]) -> bool:
+        """Save dicts and images with one bulk write for blobs and one per collection.
 
-            self.crud.update_field(collection, document, field, file_ref)
+        Blobs are owned by the field that points at them, so retrying a failed batch is safe.
+        """
+        try:
+            parsed = [(*self._parse_id(file_id), file_id, value) for file_id, value in items]
+
+            images = [(file_id, value) for _, _, _, file_id, value in parsed if isinstance(value, Image.Image)]
+            refs = dict(zip(
+                [file_id for file_id, _ in images],
+                self.crud.insert_file_binaries(
+                    [self._encode_img(img) for _, img in images],
+                    [file_id for file_id, _ in images]
+                )
+            ))
+
+            updates = {}
+            for collection, document, field, file_id, value in parsed:
+                value = refs.get(file_id, value)
+                updates.setdefault(collection, {}).setdefault(document, {})[field] = value
+
+            for collection, documents in updates.items():
+                self.crud.update_documents(collection, documents)
+
+            # Fields now point at their new blobs; release whatever they pointed at before
+            self.crud.release_file_binaries(refs)
             return True
         except Exception as e:
-            print(f"Error saving image: {e}")
+            print(f"Error saving batch: {e}")
             return False
 
     def load_img(self, file_id: str) -> Optional[Image.Image]:
@@ -81,7 +105,7 @@ class MongoFileStorage(AbstractFileStorage):
                             continue
 
                         if self.crud.is_file_ref(value):
-                            self.crud.delete_file_binary(value)
+                            self.crud.delete_file_binary(value, f"{collection}/{document}/{key}")
 
                 return self.crud.delete_document(collection, document)
 
@@ -90,7 +114,7 @@ class MongoFileStorage(AbstractFileStorage):
             if doc and field in doc:
                 value = doc[field]
                 if self.crud.is_file_ref(value):
-                    self.crud.delete_file_binary(value)
+                    self.crud.delete_file_binary(value, file_id)
 
             return self.crud.delete_field(collection, document, field)
 
@@ -0,0 +1,86 @@
+from typing import List, Optional
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, UpdateOne
+from db.mongo.crud import MongoCRUD
+
+
+class MongoParcelIndex:
+    """Parcels are stored once per analysis; every place sharing that imagery is listed in "places"."""
+
+    COLLECTION = "__parcels__"
+    PROJECTION = {"_id": 0}
+
+    def __init__(self, crud: MongoCRUD):
+        self.collection = crud.get_collection(self.COLLECTION)
+        self.collection.create_index([("centroid", GEOSPHERE)])
+        self.collection.create_index([("area_m2", DESCENDING)])
+        self.collection.create_index([("places", ASCENDING), ("area_m2", DESCENDING)])
+        self.collection.create_index([("analysis_key", ASCENDING)])
+
+    def save_parcels(self, place: str, analysis_key: str, parcels: List[dict]) -> bool:
+        """Idempotently attach the parcels of an analysis to a place and detach its older ones."""
+        try:
+            if parcels:
+                self.collection.bulk_write([
+                    UpdateOne(
+                        {"_id": f"{analysis_key}:{i}"},
+                        {
+                            "$setOnInsert": {
+                                "analysis_key": analysis_key,
+                                "area_m2": parcel["area_m2"],
+                                "area_hectares": parcel["area_hectares"],
+                                "centroid": {"type": "Point", "coordinates": parcel["centroid"]},
+                                "outline": parcel["outline"]
+                            },
+                            "$addToSet": {"places": place}
+                        },
+                        upsert=True
+                    )
+                    for i, parcel in enumerate(parcels)
+                ], ordered=False)
+
+            # The new parcels are visible before the old ones go, so queries never see a gap
+            detached = [doc["_id"] for doc in self.collection.find(
+                {"places": place, "analysis_key": {"$ne": analysis_key}}, {"_id": 1}
+            )]
+            if detached:
+                self.collection.update_many({"_id": {"$in": detached}}, {"$pull": {"places": place}})
+                self.collection.delete_many({"_id": {"$in": detached}, "places": {"$size": 0}})
+            return True
+        except Exception as e:
+            print(f"Error saving parcels: {e}")
+            return False
+
+    def _find(self, query: dict, limit: int, sort: Optional[list] = None) -> List[dict]:
+        cursor = self.collection.find(query, self.PROJECTION)
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.limit(limit))
+
+    def find_by_area(self, min_area_m2: float, place: Optional[str] = None, limit: int = 100) -> List[dict]:
+        query = {"area_m2": {"$gte": min_area_m2}}
+        if place:
+            query["places"] = place
+        return self._find(query, limit, [("area_m2", DESCENDING)])
+
+    def find_in_bbox(self, west: float, south: float, east: float, north: float,
+                     min_area_m2: float = 0, limit: int = 100) -> List[dict]:
+        box = {
+            "type": "Polygon",
+            "coordinates": [[[west, south], [east, south], [east, north], [west, north], [west, south]]]
+        }
+        query = {
+            "centroid": {"$geoWithin": {"$geometry": box}},
+            "area_m2": {"$gte": min_area_m2}
+        }
+        return self._find(query, limit, [("area_m2", DESCENDING)])
+
+    def find_nearest(self, lat: float, lon: float, min_area_m2: float = 0, limit: int = 10,
+                     max_distance_m: Optional[float] = None) -> List[dict]:
+        near = {"$geometry": {"type": "Point", "coordinates": [lon, lat]}}
+        if max_distance_m is not None:
+            near["$maxDistance"] = max_distance_m
+        query = {
+            "centroid": {"$nearSphere": near},
+            "area_m2": {"$gte": min_area_m2}
+        }
+        return self._find(query, limit)
@@ -0,0 +1,144 @@
+import atexit
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Any, List, Tuple
+from PIL import Image
+from db.file_storage import AbstractFileStorage
+
+
+class WriteBehindStorage(AbstractFileStorage):
+    """Acknowledges saves immediately and persists them in batches on a background thread.
+
+    Pending writes are served to readers until they reach the wrapped storage.
+    Callers block once max_pending writes are queued, for at most wait_timeout,
+    after which the save fails. A batch that cannot be written stays queued and
+    is retried with backoff; close() (also run at exit) waits for everything to
+    be written and only gives up after max_attempts made during close().
+    """
+
+    def __init__(self, storage: AbstractFileStorage,
+                 max_pending: int = 128,
+                 batch_size: int = 64,
+                 flush_interval: float = 0.05,
+                 max_attempts: int = 3,
+                 max_backoff: float = 5.0,
+                 wait_timeout: float = 30.0):
+        self.storage = storage
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.wait_timeout = wait_timeout
+
+        self.pending = OrderedDict()
+        self.cond = threading.Condition()
+        self.closed = False
+
+        self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def _enqueue(self, file_id: str, value: Any) -> bool:
+        with self.cond:
+            if not self.closed:
+                # Overwriting a queued entry takes no extra room
+                has_room = self.cond.wait_for(
+                    lambda: file_id in self.pending or len(self.pending) < self.max_pending,
+                    self.wait_timeout
+                )
+                if not has_room:
+                    print(f"Error saving {file_id}: write queue still full after {self.wait_timeout}s")
+                    return False
+                self.pending[file_id] = value
+                self.pending.move_to_end(file_id)
+                self.cond.notify_all()
+                return True
+        return self.storage.save_many([(file_id, value)])
+
+    def _pending(self, file_id: str, kind: type) -> Optional[Any]:
+        with self.cond:
+            value = self.pending.get(file_id)
+        return value if isinstance(value, kind) else None
+
+    def save_dict(self, data: dict, file_id: str) -> bool:
+        return self._enqueue(file_id, data)
+
+    def load_dict(self, file_id: str) -> Optional[dict]:
+        pending = self._pending(file_id, dict)
+        return pending if pending is not None else self.storage.load_dict(file_id)
+
+    def save_img(self, img: Image.Image, file_id: str) -> bool:
+        return self._enqueue(file_id, img)
+
+    def load_img(self, file_id: str) -> Optional[Image.Image]:
+        pending = self._pending(file_id, Image.Image)
+        return pending if pending is not None else self.storage.load_img(file_id)
+
+    def delete(self, file_id: str) -> bool:
+        if not self.flush():
+            print(f"Error deleting {file_id}: pending writes were not flushed")
+            return False
+        return self.storage.delete(file_id)
+
+    def get_data_dump(self):
+        if not self.flush():
+            raise TimeoutError("Pending writes were not flushed")
+        return self.storage.get_data_dump()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write is persisted; False if it takes longer than timeout."""
+        timeout = self.wait_timeout if timeout is None else timeout
+        with self.cond:
+            self.cond.wait_for(lambda: not self.pending or not self.thread.is_alive(), timeout)
+            return not self.pending
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+
+    def _write(self, batch: List[Tuple[str, Any]]) -> bool:
+        try:
+            return self.storage.save_many(batch)
+        except Exception as e:
+            print(f"Error saving batch: {e}")
+            return False
+
+    def _run(self):
+        failures = 0
+        closing = False
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                if self.closed and not closing:
+                    # max_attempts counts only the attempts made during close()
+                    closing = True
+                    failures = 0
+                if len(self.pending) < self.batch_size and not self.closed:
+                    # Give a burst of saves a moment to join the same batch
+                    self.cond.wait(self.flush_interval)
+                batch = list(itertools.islice(self.pending.items(), self.batch_size))
+
+            if not self._write(batch):
+                failures += 1
+                if not closing or failures < self.max_attempts:
+                    # Keep the batch queued; save_many is safe to repeat
+                    time.sleep(min(self.max_backoff, self.flush_interval * 2 ** failures))
+                    continue
+                print(f"Error saving batch: giving up on {len(batch)} writes at shutdown")
+            else:
+                failures = 0
+
+            with self.cond:
+                for file_id, value in batch:
+                    # Entries overwritten during the write stay queued for the next batch
+                    if self.pending.get(file_id) is value:
+                        del self.pending[file_id]
+                self.cond.notify_all()
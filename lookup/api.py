@@ -1,11 +1,20 @@
 import requests
 import urllib.request
+import hashlib
 import io
 import math
+import threading
+import time
 import numpy as np
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, Tuple
 from PIL import Image
+from lookup.policy import ProviderPolicy
+
+# Image.info key holding the sha256 of the downloaded imagery. Unlike the pixels,
+# it survives the lossy copy kept in storage, so analyses can be keyed by it.
+IMAGERY_HASH_INFO = "imagery_sha256"
 
 class AbstractAPIManager(ABC):
     @abstractmethod
@@ -33,20 +42,88 @@ class AbstractAPIManager(ABC):
 
         air_pollution_index = self.find_air_pollution_index(results, query=place_name)
 
-        return photo_img, pixel_area_m2, air_pollution_index
+        return photo_img, pixel_area_m2, air_pollution_index, results
 
 
 class FreeAPIManager(AbstractAPIManager):
+    PHOTON_URL = "https://photon.komoot.io/api/"
+    ARCGIS_URL = "https://services.arcgisonline.com/arcgis/rest/services/World_Imagery/MapServer/export"
+    OWM_URL = "https://api.openweathermap.org/data/2.5/air_pollution"
+
     def __init__(self, storage,
                  owm_api_key: str,
                  bbox_delta: float = 0.005,
                  img_width: int = 600,
-                 img_height: int = 400):
+                 img_height: int = 400,
+                 photo_ttl: float = 30 * 24 * 3600,
+                 pollution_ttl: float = 3600,
+                 policies: Optional[Dict[str, ProviderPolicy]] = None,
+                 photon_url: Optional[str] = None,
+                 arcgis_url: Optional[str] = None,
+                 owm_url: Optional[str] = None):
         self.storage = storage
         self.owm_api_key = owm_api_key
         self.bbox_delta = bbox_delta
         self.img_width = img_width
         self.img_height = img_height
+        self.photo_ttl = photo_ttl
+        self.pollution_ttl = pollution_ttl
+        self.photon_url = photon_url or self.PHOTON_URL
+        self.arcgis_url = arcgis_url or self.ARCGIS_URL
+        self.owm_url = owm_url or self.OWM_URL
+        self.policies = policies or {
+            "photon": ProviderPolicy("photon", rate=1.0, burst=2, max_concurrency=2, timeout=10, budget=15),
+            "arcgis": ProviderPolicy("arcgis", rate=5.0, burst=5, max_concurrency=4, timeout=20, budget=30),
+            "owm": ProviderPolicy("owm", rate=1.0, burst=5, max_concurrency=2, timeout=10, budget=15)
+        }
+
+        self.refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lookup-refresh")
+        self.refreshing = set()
+        self.refresh_lock = threading.Lock()
+
+    def _get_json(self, provider: str, url: str, params: dict) -> Any:
+        policy = self.policies[provider]
+
+        def request(timeout):
+            r = requests.get(url, params=params, timeout=timeout)
+            r.raise_for_status()
+            return r.json()
+
+        return policy.call(request)
+
+    def _get_bytes(self, provider: str, url: str) -> bytes:
+        policy = self.policies[provider]
+
+        def request(timeout):
+            with urllib.request.urlopen(url, timeout=timeout) as r:
+                return r.read()
+
+        return policy.call(request)
+
+    def mark_fetched(self, file_id: str, **extra):
+        self.storage.save_dict({"fetched_at": time.time(), **extra}, f"{file_id}_meta")
+
+    def revalidate_if_stale(self, file_id: str, ttl: float, refresh, *args, meta: Optional[dict] = None):
+        """Schedule a single background refresh of an expired cache entry."""
+        if meta is None:
+            meta = self.storage.load_dict(f"{file_id}_meta")
+        if isinstance(meta, dict) and time.time() - meta.get("fetched_at", 0) < ttl:
+            return
+
+        with self.refresh_lock:
+            if file_id in self.refreshing:
+                return
+            self.refreshing.add(file_id)
+        self.refresher.submit(self._refresh, file_id, refresh, *args)
+
+    def _refresh(self, file_id: str, refresh, *args):
+        try:
+            refresh(*args)
+        except Exception as e:
+            print(f"Error refreshing {file_id}: {e}")
+        finally:
+            with self.refresh_lock:
+                self.refreshing.discard(file_id)
 
     def find_photo(self, results, query=None) -> Optional[Tuple[Image.Image, float]]:
         lat = results.get('lat')
@@ -56,25 +133,32 @@ class FreeAPIManager(AbstractAPIManager):
         img_file_id = f"locations/{name}/photo"
         cached_img = self.storage.load_img(img_file_id)
         if isinstance(cached_img, Image.Image):
+            meta = self.storage.load_dict(f"{img_file_id}_meta")
+            if isinstance(meta, dict) and meta.get(IMAGERY_HASH_INFO):
+                cached_img.info[IMAGERY_HASH_INFO] = meta[IMAGERY_HASH_INFO]
+            self.revalidate_if_stale(img_file_id, self.photo_ttl, self.fetch_photo, lat, lon, img_file_id, meta=meta)
             return cached_img, self.compute_pixel_scale(lat)
 
+        img = self.fetch_photo(lat, lon, img_file_id)
+        pixel_area_m2 = self.compute_pixel_scale(lat)
+        return img, pixel_area_m2
+
+    def fetch_photo(self, lat: float, lon: float, img_file_id: str) -> Image.Image:
+        west, south, east, north = self.compute_bbox(lat, lon)
         url = (
-            "https://services.arcgisonline.com/arcgis/rest/services/"
-            "World_Imagery/MapServer/export?"
-            f"bbox={lon - self.bbox_delta},{lat - self.bbox_delta},"
-            f"{lon + self.bbox_delta},{lat + self.bbox_delta}"
+            f"{self.arcgis_url}?"
+            f"bbox={west},{south},{east},{north}"
             f"&bboxSR=4326&size={self.img_width},{self.img_height}&f=image"
         )
-
-        with urllib.request.urlopen(url, timeout=60) as r:
-            img_data = r.read()
+        img_data = self._get_bytes("arcgis", url)
 
         img = Image.open(io.BytesIO(img_data))
         img.load()
+        digest = hashlib.sha256(img_data).hexdigest()
+        img.info[IMAGERY_HASH_INFO] = digest
         self.storage.save_img(img, img_file_id)
-
-        pixel_area_m2 = self.compute_pixel_scale(lat)
-        return img, pixel_area_m2
+        self.mark_fetched(img_file_id, **{IMAGERY_HASH_INFO: digest})
+        return img
 
     def find_coordinates(self, query: str) -> Optional[Dict[str, Any]]:
         file_id = f"locations/{query}/coords"
@@ -82,13 +166,7 @@ class FreeAPIManager(AbstractAPIManager):
         if isinstance(cached, dict):
             return cached
 
-        r = requests.get(
-            "https://photon.komoot.io/api/",
-            params={"q": query, "limit": 1},
-            timeout=60
-        )
-        r.raise_for_status()
-        data = r.json()
+        data = self._get_json("photon", self.photon_url, {"q": query, "limit": 1})
         if not data.get("features"):
             return None
 
@@ -105,16 +183,17 @@ class FreeAPIManager(AbstractAPIManager):
 
         cached = self.storage.load_dict(file_id)
         if isinstance(cached, dict):
+            self.revalidate_if_stale(file_id, self.pollution_ttl, self.fetch_air_pollution_index, lat, lon, file_id)
             return cached
 
+        return self.fetch_air_pollution_index(lat, lon, file_id)
+
+    def fetch_air_pollution_index(self, lat: float, lon: float, file_id: str) -> Dict[str, Any]:
         if not self.owm_api_key:
             raise ValueError("OpenWeather API key not set in FreeAPIManager")
 
-        url = "https://api.openweathermap.org/data/2.5/air_pollution"
         params = {"lat": lat, "lon": lon, "appid": self.owm_api_key}
-        resp = requests.get(url, params=params, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        data = self._get_json("owm", self.owm_url, params)
 
         if not data.get("list"):
             raise ValueError(f"No air pollution data for {lat},{lon}")
@@ -215,10 +294,17 @@ class FreeAPIManager(AbstractAPIManager):
         }
 
         self.storage.save_dict(result, file_id)
+        self.mark_fetched(file_id)
         return result
 
 
 
+    def compute_bbox(self, lat: float, lon: float) -> Tuple[float, float, float, float]:
+        return (
+            lon - self.bbox_delta, lat - self.bbox_delta,
+            lon + self.bbox_delta, lat + self.bbox_delta
+        )
+
     def compute_pixel_scale(self, lat: float) -> float:
         meters_per_deg = 111_320
         lat_m = self.bbox_delta * meters_per_deg
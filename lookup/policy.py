@@ -0,0 +1,197 @@
+import random
+import threading
+import time
+import urllib.error
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+
+
+class ProviderUnavailableError(RuntimeError):
+    """Raised when a provider is throttled locally, its circuit is open or a call ran out of time."""
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let a single trial request through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def abort_trial(self):
+        """Give back a half-open trial that never reached the provider."""
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                # opened_at is left as is, so the next caller gets the trial straight away
+                self.state = self.OPEN
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ProviderPolicy:
+    """Rate limit, concurrency limit, retries and circuit breaking for one upstream provider.
+
+    Every call has a time budget covering the waits for a token and a slot, the
+    requests themselves and the pauses between retries.
+    """
+
+    def __init__(self, name: str,
+                 rate: float = 1.0,
+                 burst: float = 1.0,
+                 max_concurrency: int = 2,
+                 timeout: float = 10.0,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.5,
+                 backoff_max: float = 5.0,
+                 acquire_timeout: float = 10.0,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 budget: float = 30.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.acquire_timeout = acquire_timeout
+        self.budget = budget
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    @staticmethod
+    def status_of(exc: Exception) -> Optional[int]:
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            return exc.response.status_code
+        if isinstance(exc, urllib.error.HTTPError):
+            return exc.code
+        return None
+
+    @classmethod
+    def is_retryable(cls, exc: Exception) -> bool:
+        status = cls.status_of(exc)
+        if status is not None:
+            return status == 429 or status >= 500
+        return isinstance(exc, (requests.RequestException, urllib.error.URLError, OSError))
+
+    @classmethod
+    def retry_after(cls, exc: Exception) -> Optional[float]:
+        """Seconds a 429/503 response asked us to wait, if it said so."""
+        if cls.status_of(exc) not in (429, 503):
+            return None
+        headers = exc.response.headers if isinstance(exc, requests.HTTPError) else exc.headers
+        value = headers.get("Retry-After") if headers is not None else None
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying workers from hitting the provider in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Run fn(*args, timeout=..., **kwargs) under the policy.
+
+        fn gets the request timeout to use, cut short when little of the budget is left.
+        """
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise ProviderUnavailableError(f"{self.name}: circuit open")
+            if not self.bucket.acquire(min(self.acquire_timeout, max(0.0, deadline - time.monotonic()))):
+                self.breaker.abort_trial()
+                raise ProviderUnavailableError(f"{self.name}: rate limit exceeded")
+            if not self.slots.acquire(timeout=min(self.acquire_timeout, max(0.0, deadline - time.monotonic()))):
+                self.breaker.abort_trial()
+                raise ProviderUnavailableError(f"{self.name}: too many concurrent requests")
+
+            try:
+                timeout = min(self.timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    self.breaker.abort_trial()
+                    raise ProviderUnavailableError(f"{self.name}: time budget exhausted")
+                result = fn(*args, timeout=timeout, **kwargs)
+            except ProviderUnavailableError:
+                raise
+            except Exception as e:
+                if not self.is_retryable(e):
+                    # The provider answered, it just rejected this request
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = max(self.backoff(attempt), self.retry_after(e) or 0.0)
+                if time.monotonic() + delay >= deadline:
+                    raise ProviderUnavailableError(f"{self.name}: time budget exhausted") from e
+            else:
+                self.breaker.record_success()
+                return result
+            finally:
+                self.slots.release()
+
+            time.sleep(delay)
+            attempt += 1
@@ -1 +1,2 @@
-import web.web_interface
\ No newline at end of file
+if __name__ == "__main__":
+    import web.web_interface
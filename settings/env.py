@@ -7,6 +7,10 @@ OWM_API = os.getenv("OWM_API")
 WEB_IP = os.getenv("WEB_IP", "0.0.0.0")
 WEB_PORT = int(os.getenv("WEB_PORT", 5000))
 
+# Size of the CPU process pool for image analysis, independent of HTTP threads (0 = run inline).
+# One core is left to the web server, so single-core hosts analyse inline by default.
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", max(0, (os.cpu_count() or 1) - 1)))
+
 MONGO_IP = os.getenv("MONGO_IP", "127.0.0.1")
 MONGO_PORT = int(os.getenv("MONGO_PORT", 27017))
 MONGO_USER = os.getenv("MONGO_USER", "root")      
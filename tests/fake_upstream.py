@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeUpstream:
+    """Local HTTP server that replays scripted responses with optional latency.
+
+    Each request takes the next (status, body, delay, headers) from the script; once the
+    script is empty the default response is used. Bytes bodies are sent as is,
+    anything else as JSON.
+    """
+
+    def __init__(self, status: int = 200, body=None, delay: float = 0.0):
+        self.default = (status, body if body is not None else {}, delay, {})
+        self.script = []
+        self.hits = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                upstream.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/"
+
+    def respond(self, status: int = 200, body=None, delay: float = 0.0, times: int = 1, headers=None):
+        with self.lock:
+            self.script.extend([(status, body if body is not None else {}, delay, headers or {})] * times)
+
+    def set_default(self, status: int = 200, body=None, delay: float = 0.0, headers=None):
+        with self.lock:
+            self.default = (status, body if body is not None else {}, delay, headers or {})
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        with self.lock:
+            self.hits += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            status, body, delay, headers = self.script.pop(0) if self.script else self.default
+
+        try:
+            if delay:
+                time.sleep(delay)
+            if isinstance(body, bytes):
+                payload, content_type = body, "application/octet-stream"
+            else:
+                payload, content_type = json.dumps(body).encode("utf-8"), "application/json"
+            request.send_response(status)
+            request.send_header("Content-Type", content_type)
+            request.send_header("Content-Length", str(len(payload)))
+            for name, value in headers.items():
+                request.send_header(name, value)
+            request.end_headers()
+            request.wfile.write(payload)
+        except OSError:
+            # The client gave up (timeout) before the reply was sent
+            pass
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import time
+
+import numpy as np
+import pytest
+import requests
+from PIL import Image
+
+from lookup.api import FreeAPIManager, IMAGERY_HASH_INFO
+from lookup.policy import ProviderPolicy
+
+
+class MemoryStorage:
+    """Keeps images as JPEG bytes, like MongoFileStorage, so loaded pixels differ from saved ones."""
+
+    def __init__(self):
+        self.data = {}
+
+    def save_dict(self, data, file_id):
+        self.data[file_id] = data
+        return True
+
+    def load_dict(self, file_id):
+        return self.data.get(file_id)
+
+    def save_img(self, img, file_id):
+        buffer = io.BytesIO()
+        img.convert("RGB").save(buffer, format="JPEG")
+        self.data[file_id] = buffer.getvalue()
+        return True
+
+    def load_img(self, file_id):
+        data = self.data.get(file_id)
+        return Image.open(io.BytesIO(data)) if data else None
+
+
+def owm_body(pm25: float) -> dict:
+    return {"list": [{"components": {"pm2_5": pm25}}]}
+
+
+def fast_policy(name: str) -> ProviderPolicy:
+    return ProviderPolicy(name, rate=1000, burst=1000, timeout=1.0, max_retries=1,
+                          backoff_base=0.01, backoff_max=0.02, failure_threshold=10)
+
+
+def make_manager(upstream, **kwargs) -> FreeAPIManager:
+    policies = {"owm": fast_policy("owm"), "arcgis": fast_policy("arcgis")}
+    return FreeAPIManager(MemoryStorage(), "key", policies=policies,
+                          owm_url=upstream.url, arcgis_url=upstream.url, **kwargs)
+
+
+def png_bytes() -> bytes:
+    rng = np.random.default_rng(0)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 255, (40, 60, 3), dtype=np.uint8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+COORDS = {"lat": 50.0, "lng": 30.0}
+
+
+def test_fresh_entry_is_served_from_cache(upstream):
+    upstream.set_default(200, owm_body(5.0))
+    manager = make_manager(upstream, pollution_ttl=60)
+
+    first = manager.find_air_pollution_index(COORDS, "Kyiv")
+    second = manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    assert first == second
+    assert upstream.hits == 1
+
+
+def test_stale_entry_is_served_while_refreshing(upstream):
+    upstream.set_default(200, owm_body(5.0))
+    manager = make_manager(upstream, pollution_ttl=0.05)
+    old = manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    time.sleep(0.1)
+    upstream.set_default(200, owm_body(100.0), delay=0.3)
+    start = time.monotonic()
+    served = manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    assert served == old
+    assert time.monotonic() - start < 0.1
+    assert wait_for(lambda: manager.storage.load_dict("locations/Kyiv/pollution")["aqi"] != old["aqi"])
+
+
+def test_single_refresh_per_stale_entry(upstream):
+    upstream.set_default(200, owm_body(5.0))
+    manager = make_manager(upstream, pollution_ttl=0.05)
+    manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    time.sleep(0.1)
+    upstream.set_default(200, owm_body(5.0), delay=0.2)
+    for _ in range(5):
+        manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    assert wait_for(lambda: not manager.refreshing)
+    assert upstream.hits == 2
+
+
+def test_stale_entry_survives_failing_upstream(upstream):
+    upstream.set_default(200, owm_body(5.0))
+    manager = make_manager(upstream, pollution_ttl=0.05)
+    old = manager.find_air_pollution_index(COORDS, "Kyiv")
+
+    time.sleep(0.1)
+    upstream.set_default(503)
+    assert manager.find_air_pollution_index(COORDS, "Kyiv") == old
+    assert wait_for(lambda: not manager.refreshing)
+    assert manager.find_air_pollution_index(COORDS, "Kyiv") == old
+
+
+def test_missing_entry_surfaces_upstream_error(upstream):
+    upstream.set_default(503)
+    manager = make_manager(upstream)
+
+    with pytest.raises(requests.HTTPError):
+        manager.find_air_pollution_index(COORDS, "Kyiv")
+
+
+def test_photo_keeps_imagery_hash_when_loaded_from_storage(upstream):
+    photo = png_bytes()
+    upstream.set_default(200, photo)
+    manager = make_manager(upstream)
+
+    fresh, _ = manager.find_photo(COORDS, "Kyiv")
+    cached, _ = manager.find_photo(COORDS, "Kyiv")
+
+    assert upstream.hits == 1
+    assert not np.array_equal(np.asarray(fresh.convert("RGB")), np.asarray(cached.convert("RGB")))
+    assert fresh.info[IMAGERY_HASH_INFO] == cached.info[IMAGERY_HASH_INFO] == hashlib.sha256(photo).hexdigest()
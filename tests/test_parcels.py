@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from air_pollution_core.parcels import ParcelExtractor
+
+
+def make_mask(height=40, width=60):
+    return np.zeros((height, width), dtype=np.uint8)
+
+
+def test_drops_specks_below_min_pixels():
+    mask = make_mask()
+    mask[5:15, 5:15] = 255
+    mask[30:33, 50:53] = 255
+
+    parcels = ParcelExtractor(min_pixels=20).extract(mask)
+
+    assert [p["pixels"] for p in parcels] == [100]
+
+
+def test_separate_blobs_become_separate_parcels():
+    mask = make_mask()
+    mask[2:12, 2:12] = 255
+    mask[20:30, 40:55] = 255
+
+    parcels = ParcelExtractor(min_pixels=20).extract(mask)
+
+    assert sorted(p["pixels"] for p in parcels) == [100, 150]
+    centroids = sorted(tuple(p["centroid"]) for p in parcels)
+    assert centroids == [(6.5, 6.5), (47.0, 24.5)]
+
+
+def test_outline_follows_the_blob():
+    mask = make_mask()
+    mask[10:20, 30:50] = 255
+
+    parcel, = ParcelExtractor().extract(mask)
+
+    xs = [x for x, _ in parcel["outline"]]
+    ys = [y for _, y in parcel["outline"]]
+    assert (min(xs), max(xs), min(ys), max(ys)) == (30, 49, 10, 19)
+
+
+def test_area_is_pixels_times_pixel_area():
+    parcels = [{"pixels": 250, "outline": [[0, 0]], "centroid": [0, 0]}]
+
+    result, = ParcelExtractor.georeference(parcels, (30.0, 50.0, 30.1, 50.1), 40, 60, pixel_to_m2=4.0)
+
+    assert result["area_m2"] == pytest.approx(1000.0)
+    assert result["area_hectares"] == pytest.approx(0.1)
+
+
+def test_pixel_corners_map_to_bbox_corners():
+    west, south, east, north = 30.0, 50.0, 30.06, 50.04
+    height, width = 40, 60
+    parcels = [{
+        "pixels": 1,
+        "outline": [[0, 0], [width, 0], [width, height], [0, height]],
+        "centroid": [width / 2, height / 2]
+    }]
+
+    result, = ParcelExtractor.georeference(parcels, (west, south, east, north), height, width, 1.0)
+
+    assert result["outline"] == [
+        pytest.approx([west, north]), pytest.approx([east, north]),
+        pytest.approx([east, south]), pytest.approx([west, south])
+    ]
+    assert result["centroid"] == pytest.approx([(west + east) / 2, (south + north) / 2])
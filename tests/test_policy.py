@@ -0,0 +1,182 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from lookup.policy import CircuitBreaker, ProviderPolicy, ProviderUnavailableError, TokenBucket
+
+
+def fast_policy(**kwargs):
+    options = dict(rate=1000, burst=1000, max_concurrency=4, timeout=1.0, max_retries=2,
+                   backoff_base=0.01, backoff_max=0.02, acquire_timeout=1.0,
+                   failure_threshold=3, reset_timeout=0.2)
+    options.update(kwargs)
+    return ProviderPolicy("fake", **options)
+
+
+def get_json(policy, url):
+    def request(timeout):
+        r = requests.get(url, timeout=timeout)
+        r.raise_for_status()
+        return r.json()
+
+    return policy.call(request)
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        assert bucket.acquire()
+    assert time.monotonic() - start >= 0.18
+
+
+def test_token_bucket_acquire_times_out():
+    bucket = TokenBucket(rate=1, capacity=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(timeout=0.05)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_transient_errors(upstream, status):
+    upstream.respond(status, times=2)
+    upstream.set_default(200, {"ok": True})
+
+    assert get_json(fast_policy(), upstream.url) == {"ok": True}
+    assert upstream.hits == 3
+
+
+def test_does_not_retry_client_errors(upstream):
+    upstream.set_default(404)
+    policy = fast_policy()
+
+    with pytest.raises(requests.HTTPError):
+        get_json(policy, upstream.url)
+    assert upstream.hits == 1
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_gives_up_after_max_retries(upstream):
+    upstream.set_default(503)
+
+    with pytest.raises(requests.HTTPError):
+        get_json(fast_policy(max_retries=1, failure_threshold=10), upstream.url)
+    assert upstream.hits == 2
+
+
+def test_retries_slow_responses(upstream):
+    upstream.respond(200, {"ok": False}, delay=0.5)
+    upstream.set_default(200, {"ok": True})
+
+    assert get_json(fast_policy(timeout=0.1), upstream.url) == {"ok": True}
+    assert upstream.hits == 2
+
+
+def test_honours_retry_after(upstream):
+    upstream.respond(429, headers={"Retry-After": "0.3"})
+    upstream.set_default(200, {"ok": True})
+
+    start = time.monotonic()
+    assert get_json(fast_policy(), upstream.url) == {"ok": True}
+    assert time.monotonic() - start >= 0.3
+    assert upstream.hits == 2
+
+
+def test_fails_fast_when_retry_after_exceeds_budget(upstream):
+    upstream.set_default(429, headers={"Retry-After": "60"})
+
+    start = time.monotonic()
+    with pytest.raises(ProviderUnavailableError, match="budget"):
+        get_json(fast_policy(budget=1.0), upstream.url)
+    assert time.monotonic() - start < 0.5
+    assert upstream.hits == 1
+
+
+def test_budget_bounds_slow_retries(upstream):
+    upstream.set_default(200, {"ok": True}, delay=1.0)
+    policy = fast_policy(timeout=0.3, max_retries=10, failure_threshold=100, budget=0.5)
+
+    start = time.monotonic()
+    with pytest.raises((ProviderUnavailableError, requests.Timeout)):
+        get_json(policy, upstream.url)
+    assert time.monotonic() - start < 0.8
+
+
+def test_bounds_concurrency(upstream):
+    upstream.set_default(200, {"ok": True}, delay=0.1)
+    policy = fast_policy(max_concurrency=2)
+
+    threads = [threading.Thread(target=get_json, args=(policy, upstream.url)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert upstream.hits == 6
+    assert upstream.max_in_flight <= 2
+
+
+def test_breaker_opens_and_fails_fast(upstream):
+    upstream.set_default(503)
+    policy = fast_policy(max_retries=0, failure_threshold=2, reset_timeout=10)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            get_json(policy, upstream.url)
+
+    with pytest.raises(ProviderUnavailableError, match="circuit open"):
+        get_json(policy, upstream.url)
+    assert upstream.hits == 2
+
+
+def test_breaker_closes_after_successful_trial(upstream):
+    upstream.respond(503, times=2)
+    upstream.set_default(200, {"ok": True})
+    policy = fast_policy(max_retries=0, failure_threshold=2, reset_timeout=0.1)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            get_json(policy, upstream.url)
+
+    time.sleep(0.15)
+    assert get_json(policy, upstream.url) == {"ok": True}
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_trial_released_when_no_slot(upstream):
+    upstream.set_default(503)
+    policy = fast_policy(max_retries=0, max_concurrency=1, failure_threshold=1,
+                         reset_timeout=0.1, acquire_timeout=0.05)
+
+    with pytest.raises(requests.HTTPError):
+        get_json(policy, upstream.url)
+    time.sleep(0.15)
+
+    # The trial request cannot get a slot, so it must hand the trial back
+    policy.slots.acquire()
+    with pytest.raises(ProviderUnavailableError, match="concurrent"):
+        get_json(policy, upstream.url)
+    policy.slots.release()
+
+    upstream.set_default(200, {"ok": True})
+    assert get_json(policy, upstream.url) == {"ok": True}
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_trial_released_when_rate_limited(upstream):
+    upstream.set_default(503)
+    policy = fast_policy(rate=5, burst=1, max_retries=0, failure_threshold=1,
+                         reset_timeout=0.1, acquire_timeout=0.01)
+
+    with pytest.raises(requests.HTTPError):
+        get_json(policy, upstream.url)
+    time.sleep(0.12)
+
+    policy.bucket.acquire()
+    with pytest.raises(ProviderUnavailableError, match="rate limit"):
+        get_json(policy, upstream.url)
+
+    time.sleep(0.25)
+    upstream.set_default(200, {"ok": True})
+    assert get_json(policy, upstream.url) == {"ok": True}
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from PIL import Image
+
+from db.file_storage import AbstractFileStorage
+from db.write_behind import WriteBehindStorage
+
+
+class MemoryStorage(AbstractFileStorage):
+    def __init__(self):
+        self.data = {}
+        self.writes = 0
+
+    def save_dict(self, data, file_id):
+        self.data[file_id] = data
+        return True
+
+    def load_dict(self, file_id):
+        value = self.data.get(file_id)
+        return value if isinstance(value, dict) else None
+
+    def save_img(self, img, file_id):
+        self.data[file_id] = img
+        return True
+
+    def load_img(self, file_id):
+        value = self.data.get(file_id)
+        return value if isinstance(value, Image.Image) else None
+
+    def save_many(self, items):
+        self.writes += 1
+        return super().save_many(items)
+
+    def delete(self, file_id):
+        return self.data.pop(file_id, None) is not None
+
+    def get_data_dump(self):
+        return dict(self.data)
+
+
+class FlakyStorage(MemoryStorage):
+    """Fails every write while down; writes wait while the gate is closed."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.attempts = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+
+    def save_many(self, items):
+        self.attempts += 1
+        self.entered.set()
+        self.gate.wait()
+        if self.down:
+            return False
+        return super().save_many(items)
+
+
+def make_storage(storage, **kwargs):
+    options = dict(flush_interval=0.01, max_backoff=0.02, wait_timeout=2.0)
+    options.update(kwargs)
+    return WriteBehindStorage(storage, **options)
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_pending_writes_are_readable():
+    backend = FlakyStorage()
+    backend.gate.clear()
+    storage = make_storage(backend)
+    img = Image.new("RGB", (4, 4))
+
+    assert storage.save_dict({"a": 1}, "locations/kyiv/coords")
+    assert storage.save_img(img, "locations/kyiv/photo")
+
+    assert storage.load_dict("locations/kyiv/coords") == {"a": 1}
+    assert storage.load_img("locations/kyiv/photo") is img
+    assert backend.data == {}
+
+    backend.gate.set()
+    assert storage.flush()
+    assert backend.data == {"locations/kyiv/coords": {"a": 1}, "locations/kyiv/photo": img}
+    storage.close()
+
+
+def test_overwrite_during_write_is_not_lost():
+    backend = FlakyStorage()
+    backend.gate.clear()
+    storage = make_storage(backend)
+
+    storage.save_dict({"v": 1}, "locations/kyiv/summary")
+    assert backend.entered.wait(1)
+    storage.save_dict({"v": 2}, "locations/kyiv/summary")
+    backend.gate.set()
+
+    assert storage.flush()
+    assert backend.data["locations/kyiv/summary"] == {"v": 2}
+    storage.close()
+
+
+def test_backpressure_times_out_when_queue_stays_full():
+    backend = FlakyStorage()
+    backend.gate.clear()
+    storage = make_storage(backend, max_pending=2, wait_timeout=0.1)
+
+    assert storage.save_dict({}, "a/a/a")
+    assert storage.save_dict({}, "a/a/b")
+    # Overwriting a queued entry needs no room
+    assert storage.save_dict({"again": True}, "a/a/b")
+
+    start = time.monotonic()
+    assert not storage.save_dict({}, "a/a/c")
+    assert time.monotonic() - start >= 0.1
+    assert not storage.flush(timeout=0.05)
+    assert not storage.delete("a/a/a")
+
+    backend.gate.set()
+    storage.close()
+
+
+def test_failed_batch_is_retried_until_it_succeeds():
+    backend = FlakyStorage()
+    backend.down = True
+    storage = make_storage(backend)
+
+    storage.save_dict({"a": 1}, "a/a/a")
+    assert wait_for(lambda: backend.attempts >= 3)
+    assert backend.data == {}
+
+    backend.down = False
+    assert storage.flush()
+    assert backend.data == {"a/a/a": {"a": 1}}
+    storage.close()
+
+
+def test_close_retries_after_earlier_failures():
+    backend = FlakyStorage()
+    backend.down = True
+    storage = make_storage(backend, max_attempts=3)
+
+    storage.save_dict({"a": 1}, "a/a/a")
+    assert wait_for(lambda: backend.attempts >= 5)
+
+    # The outage before close() must not use up its attempts
+    before = backend.attempts
+    threading.Timer(0.02, lambda: setattr(backend, "down", False)).start()
+    storage.close()
+
+    assert backend.data == {"a/a/a": {"a": 1}}
+    assert backend.attempts - before <= 3
+
+
+def test_close_gives_up_after_max_attempts():
+    backend = FlakyStorage()
+    backend.down = True
+    storage = make_storage(backend, max_attempts=3)
+
+    storage.save_dict({"a": 1}, "a/a/a")
+    assert wait_for(lambda: backend.attempts >= 1)
+    before = backend.attempts
+    storage.close()
+
+    assert not storage.thread.is_alive()
+    assert backend.data == {}
+    assert 3 <= backend.attempts - before <= 4
+
+
+def test_saves_after_close_are_written_directly():
+    backend = MemoryStorage()
+    storage = make_storage(backend)
+    storage.close()
+
+    assert storage.save_dict({"a": 1}, "a/a/a")
+    assert backend.data == {"a/a/a": {"a": 1}}
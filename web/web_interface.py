@@ -1,14 +1,19 @@
-from flask import Flask, render_template, request, redirect, url_for, Response
+from flask import Flask, render_template, request, redirect, url_for, Response, jsonify
 import io
 import base64
+import signal
+import sys
 import air_pollution_core.proceeder as ap
 from PIL import Image
 import settings.env as settings
 from functools import wraps
 
 app = Flask("server")
-proceeder = ap.SatelliteImageProceeder(settings.OWM_API, settings.MONGO_IP, settings.MONGO_PORT, settings.MONGO_USER, settings.MONGO_PASS)
+proceeder = ap.SatelliteImageProceeder(settings.OWM_API, settings.MONGO_IP, settings.MONGO_PORT, settings.MONGO_USER, settings.MONGO_PASS,
+                                       analysis_workers=settings.ANALYSIS_WORKERS)
 storage = proceeder.get_storage()
+parcel_index = proceeder.get_parcel_index()
+location_index = proceeder.get_location_index()
 
 def check_auth(username, password):
     return username == settings.ADMIN_USER and password == settings.ADMIN_PASS
@@ -91,7 +96,58 @@ def admin_panel():
         else:
             message = "Collection and Document are required!"
 
-    db_dump = storage.get_data_dump()
+    try:
+        db_dump = storage.get_data_dump()
+    except TimeoutError as e:
+        db_dump = {}
+        message = f"Storage is not responding: {e}"
     return render_template("admin.html", collections=db_dump, message=message)
+
+@app.route("/api/parcels")
+def parcels():
+    min_area_m2 = request.args.get("min_area_m2", 0, type=float)
+    limit = request.args.get("limit", 100, type=int)
+    bbox = request.args.get("bbox")
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+
+    if bbox:
+        try:
+            west, south, east, north = (float(v) for v in bbox.split(","))
+        except ValueError:
+            return jsonify({"error": "bbox must be 'west,south,east,north'"}), 400
+        result = parcel_index.find_in_bbox(west, south, east, north, min_area_m2, limit)
+    elif lat is not None and lon is not None:
+        result = parcel_index.find_nearest(lat, lon, min_area_m2, limit)
+    else:
+        result = parcel_index.find_by_area(min_area_m2, request.args.get("place"), limit)
+
+    return jsonify(result)
+
+@app.route("/api/locations/top")
+def top_locations():
+    field = request.args.get("by", "trees_to_plant")
+    limit = request.args.get("n", 10, type=int)
+    ascending = request.args.get("order", "desc") == "asc"
+    try:
+        return jsonify(location_index.top(field, limit, ascending))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/locations/nearest")
+def nearest_locations():
+    lat = request.args.get("lat", type=float)
+    lon = request.args.get("lon", type=float)
+    if lat is None or lon is None:
+        return jsonify({"error": "lat and lon are required"}), 400
+
+    limit = request.args.get("k", 10, type=int)
+    radius_km = request.args.get("radius_km", type=float)
+    min_aqi = request.args.get("min_aqi", type=float)
+    return jsonify(location_index.nearest(lat, lon, limit, radius_km, min_aqi))
     
-app.run(debug=True, host=settings.WEB_IP, port=settings.WEB_PORT)
+# docker stop sends SIGTERM; exiting normally runs the atexit hook that flushes queued writes
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+# The reloader would import this module twice and start a second, idle analysis pool
+app.run(debug=True, use_reloader=False, host=settings.WEB_IP, port=settings.WEB_PORT)